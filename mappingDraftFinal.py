@@ -1,10 +1,20 @@
 import serial
 import numpy as np
 import matplotlib.pyplot as plt
-from matplotlib.colors import LinearSegmentedColormap
+from matplotlib.colors import LinearSegmentedColormap, Normalize
 from matplotlib.widgets import Button
+from matplotlib.animation import FuncAnimation
 from math import radians
-import time
+import collections
+import io
+import re
+import threading
+
+# Matches the Arduino line format: 'Angle: X°, Distance: Y mm'
+# Each number must be well-formed and followed by its literal delimiter, so
+# corrupt fields like '1.2.3' fail to match and float() on a group cannot fail
+_LINE_RE = re.compile(rb'Angle:\s*(-?\d+(?:\.\d*)?)\xc2\xb0, Distance:\s*(-?\d+(?:\.\d*)?) mm')
+_LINE_DTYPE = [('a', 'f4'), ('d', 'f4')]
 
 class PolarLidarVisualizer:
     def __init__(self, port='COM4', baud=9600):
@@ -12,7 +22,6 @@ class PolarLidarVisualizer:
         self.serial = serial.Serial(port, baud, timeout=1)
         
         # Setup the main plot
-        plt.ion()  # Turn on interactive mode
         self.fig = plt.figure(figsize=(10, 10))
         
         # Adjust the main plot area to make room for buttons
@@ -21,14 +30,28 @@ class PolarLidarVisualizer:
         self.ax = self.fig.add_subplot(111, projection='polar')
         
         # Initialize data storage with fixed size for one complete scan
-        self.buffer_size = 360  # One point per degree
-        self.angles = np.linspace(0, 2*np.pi, self.buffer_size)  # Pre-allocate angles in radians
-        self.distances = np.full(self.buffer_size, np.nan)  # Pre-allocate with NaN
+        # Power-of-two bin count so the wrap-around is a bitmask; the ~0.7° bins
+        # are far finer than the VL53L0X's 25° field of view
+        self.buffer_size = 512
+        self._bin_scale = self.buffer_size / 360.0  # Degrees to bin index
+        self._bin_mask = self.buffer_size - 1
+        self.angles = np.linspace(0, 2*np.pi, self.buffer_size, endpoint=False,
+                                  dtype=np.float32)  # Pre-allocate angles in radians
+        self.distances = np.full(self.buffer_size, np.nan, dtype=np.float32)  # Pre-allocate with NaN
+        self.angles_deg = np.degrees(self.angles)  # Angles in degrees for saving
+        self._valid_idx = np.zeros(self.buffer_size, dtype=bool)  # Indices that have received data
+        self._offsets = np.empty((self.buffer_size, 2), dtype=np.float32)  # Reused (angle, distance) pairs
+        self._offsets[:, 0] = self.angles
+        self._dirty = False  # Set when new data arrives, cleared after the artists update
+        self._leftover = b''  # Partial line carried over between serial reads
+        self._q = collections.deque(maxlen=4096)  # Raw lines from the reader thread
+        self._running = True
         
         # Plot elements
         self.line = None
         self.scatter = None
         self.colorbar = None
+        self._anim = None
         
         # Zoom settings
         self.current_range = 500  # Initial range in mm
@@ -38,11 +61,18 @@ class PolarLidarVisualizer:
         # Custom colormap
         colors = ['blue', 'green', 'yellow', 'red']
         self.colormap = LinearSegmentedColormap.from_list('custom', colors)
+        self.colormap(0.0)  # Build the 256-entry lookup table up front
+        # One fixed normalizer over the sensor range, shared by scatter and colorbar
+        self.norm = Normalize(0, self.max_range, clip=True)
         
         # Setup plot and buttons
         self.setup_plot()
         self.create_buttons()
         self.initialize_plot_elements()
+        
+        # Read serial in the background so GUI stalls don't back up the port
+        self._reader = threading.Thread(target=self._reader_loop, daemon=True)
+        self._reader.start()
         print("Waiting for Arduino data...")
 
     def create_buttons(self):
@@ -69,7 +99,7 @@ class PolarLidarVisualizer:
             self.current_range = new_range
             self.ax.set_rlim(0, self.current_range)
             self.update_distance_markers()
-            plt.draw()
+            self.fig.canvas.draw()
 
     def zoom_out(self, event):
         """Zoom out button callback"""
@@ -78,14 +108,14 @@ class PolarLidarVisualizer:
             self.current_range = new_range
             self.ax.set_rlim(0, self.current_range)
             self.update_distance_markers()
-            plt.draw()
+            self.fig.canvas.draw()
 
     def reset_view(self, event):
         """Reset view button callback"""
         self.current_range = 500  # Reset to default range
         self.ax.set_rlim(0, self.current_range)
         self.update_distance_markers()
-        plt.draw()
+        self.fig.canvas.draw()
 
     def update_distance_markers(self):
         """Update the distance markers based on current range"""
@@ -111,91 +141,123 @@ class PolarLidarVisualizer:
     def initialize_plot_elements(self):
         """Initialize the line and scatter plots"""
         # Initialize with NaN data to create empty plots
-        self.line, = self.ax.plot(self.angles, self.distances, '-', linewidth=2, color='blue', alpha=0.8)
+        self.line, = self.ax.plot(self.angles, self.distances, '-', linewidth=2, color='blue', alpha=0.8,
+                                  animated=True)
         
         # Initialize scatter with empty data and larger points
         self.scatter = self.ax.scatter(self.angles, self.distances, 
                                      c=self.distances, cmap=self.colormap, 
-                                     s=100, alpha=0.6)
+                                     norm=self.norm, s=100, alpha=0.6, animated=True)
         
         # Initialize colorbar
         self.colorbar = plt.colorbar(self.scatter)
         self.colorbar.set_label('Distance (mm)')
 
-    def parse_arduino_data(self, line):
-        """Parse the Arduino data format: 'Angle: X°, Distance: Y mm'"""
+    def update_data_batch(self, angles, distances):
+        """Update the data arrays for a batch of readings in one scatter"""
+        # Round each angle to the nearest bin, wrapping with the power-of-two mask
+        index = np.floor(angles * self._bin_scale + 0.5).astype(np.int32) & self._bin_mask
+        self.distances[index] = distances
+        self._valid_idx[index] = True
+        if index.size:
+            self._dirty = True
+
+    def _reader_loop(self):
+        """Background thread: move serial lines into the queue as they arrive"""
+        # Hoist attribute lookups out of the per-read loop
+        read_until = self.serial.read_until
+        enqueue = self._q.append
         try:
-            parts = line.split(',')
-            angle = float(parts[0].split(':')[1].strip().rstrip('°'))
-            distance = float(parts[1].split(':')[1].strip().rstrip(' mm'))
-            return angle, distance
-        except (ValueError, IndexError):
-            return None, None
-
-    def update_data(self, angle, distance):
-        """Update the data arrays at the specified angle"""
-        # Convert angle to index in our arrays
-        index = int(round(angle)) % 360
-        self.distances[index] = distance
+            while self._running:
+                # One queue entry per line (or partial line on timeout)
+                chunk = read_until(b'\n')
+                if chunk:
+                    enqueue(chunk)
+        except (serial.SerialException, OSError):
+            pass  # Port was closed while reading
+
+    def process_queued_data(self):
+        """Parse everything the reader thread has queued; return True if any"""
+        if not self._q:
+            return False
+        
+        # Drain the queue; keep the trailing partial line
+        q = self._q
+        overflowed = len(q) >= q.maxlen  # Oldest entries may have been dropped
+        popleft = q.popleft
+        parts = [self._leftover]
+        append = parts.append
+        while q:
+            append(popleft())
+        if overflowed:
+            # The leftover no longer joins up with what follows; resync on a newline
+            parts[0] = b''
+            chunk = b''.join(parts)
+            nl = chunk.find(b'\n')
+            chunk = chunk[nl + 1:] if nl >= 0 else b''
+        else:
+            chunk = b''.join(parts)
+        end = chunk.rfind(b'\n') + 1
+        self._leftover = chunk[end:]
+        complete = chunk[:end]
+        
+        # Parse the whole batch in one regex pass; corrupted lines simply don't match
+        arr = np.fromregex(io.BytesIO(complete), _LINE_RE, dtype=_LINE_DTYPE)
+        self.update_data_batch(arr['a'], arr['d'])
+        return True
+
+    def _tick(self, frame):
+        """Animation callback: parse queued data and return artists to blit"""
+        self.process_queued_data()
+        return self.update_visualization()
 
     def process_scan(self):
         """Process the scanning data from Arduino"""
+        # Let matplotlib's timer drive updates every 50ms for smoother visualization
+        self._anim = FuncAnimation(self.fig, self._tick, interval=50,
+                                   blit=True, cache_frame_data=False)
         try:
-            last_update = time.time()
-            update_interval = 0.05  # Update every 50ms for smoother visualization
-            
-            while True:
-                if self.serial.in_waiting:
-                    line = self.serial.readline().decode().strip()
-                    angle, distance = self.parse_arduino_data(line)
-                    
-                    if angle is not None and distance is not None:
-                        # Update data at this angle
-                        self.update_data(angle, distance)
-                        
-                        # Update visualization periodically
-                        current_time = time.time()
-                        if current_time - last_update >= update_interval:
-                            self.update_visualization()
-                            last_update = current_time
-                        
-        except KeyboardInterrupt:
+            plt.show()
+        finally:
+            self.stop_reader()
             self.serial.close()
-            plt.close()
+
+    def stop_reader(self):
+        """Stop the reader thread before the port it reads from is closed"""
+        self._running = False
+        if hasattr(self.serial, 'cancel_read'):
+            self.serial.cancel_read()
+        self._reader.join(timeout=2)  # Bounded by the 1 s serial timeout
 
     def update_visualization(self):
-        """Update the visualization with new data"""
-        # Update line data
-        valid_mask = ~np.isnan(self.distances)
-        angles_valid = self.angles[valid_mask]
-        distances_valid = self.distances[valid_mask]
+        """Update the plot artists and return them for blitting"""
+        # Always hand the artists back: an empty tuple makes FuncAnimation
+        # fall back to a full figure redraw instead of a blit
+        if not self._dirty:
+            return self.line, self.scatter
+        
+        # One gather of the valid (angle, distance) pairs feeds both artists
+        self._offsets[:, 1] = self.distances
+        points = self._offsets[self._valid_idx]
         
-        if len(distances_valid) > 0:
+        if len(points) > 0:
             # Update line
-            self.line.set_data(angles_valid, distances_valid)
+            self.line.set_data(points.T)
             
             # Update scatter
-            self.scatter.set_offsets(np.column_stack((angles_valid, distances_valid)))
-            self.scatter.set_array(distances_valid)
-            
-            # Update colorbar limits if we have valid data
-            valid_distances = distances_valid[~np.isnan(distances_valid)]
-            if len(valid_distances) > 0:
-                self.scatter.set_clim(np.min(valid_distances), np.max(valid_distances))
-            
-            # Draw updates
-            self.fig.canvas.draw_idle()
-            self.fig.canvas.flush_events()
+            self.scatter.set_offsets(points)
+            self.scatter.set_array(points[:, 1])
+        
+        self._dirty = False
+        return self.line, self.scatter
 
     def save_scan(self, filename):
         """Save current scan data to file"""
-        valid_mask = ~np.isnan(self.distances)
-        data = np.column_stack((
-            np.degrees(self.angles[valid_mask]),
-            self.distances[valid_mask]
-        ))
-        np.savetxt(filename, data, delimiter=',', 
-                   header='angle,distance', comments='')
+        idx = np.flatnonzero(self._valid_idx)
+        rows = zip(self.angles_deg[idx].tolist(), self.distances[idx].tolist())
+        with open(filename, 'wb') as f:
+            f.write(b'angle,distance\n')
+            f.writelines(b'%.2f,%.1f\n' % row for row in rows)
 
 def main():
     # List available ports